@@ -0,0 +1,375 @@
+import asyncio
+import gc
+import os
+import random
+import socket
+import time
+import tracemalloc
+from typing import Dict, Any, List, Optional
+
+import websockets
+
+from .logutil import log
+from .main import get_env_int, get_env_float, get_env_list, init_state
+from .formats import build_json_track, build_xml_track, sample_track
+from .services.coalescer import MODES as WRITE_MODES, format_batches
+from .services.tcp_xml import XMLServer
+from .services.tcp_json import JSONServer
+from .services.ws_json import WebSocketServer
+
+SOURCE = "bench"
+
+# service name -> (server class, port state key, data message builder)
+SERVICES = {
+    "xml": (XMLServer, "tcp_xml_port", build_xml_track),
+    "json": (JSONServer, "tcp_json_port", build_json_track),
+    "ws": (WebSocketServer, "ws_json_port", build_json_track),
+}
+
+# graceful/hard drive the server's close_clients(), abort drops the client side
+MODES = ("graceful", "hard", "abort")
+
+def load_config() -> Dict[str, Any]:
+    """Read benchmark configuration from the environment"""
+    return {
+        "services": get_env_list("CHURN_SERVICES", tuple(SERVICES)),
+        "modes": get_env_list("CHURN_MODES", MODES),
+        "cycles": get_env_int("CHURN_CYCLES", 20),
+        "rate": get_env_float("CHURN_RATE", 2.0),
+        "clients": get_env_int("CHURN_CLIENTS", 20),
+        "steady": get_env_int("CHURN_STEADY", 5),
+        "heartbeat_interval": get_env_float("CHURN_HB_SEC", 0.05),
+        "message_interval": get_env_float("CHURN_MSG_SEC", 0.2),
+        "backoff_base": get_env_float("CHURN_BACKOFF_BASE", 0.01),
+        "backoff_max": get_env_float("CHURN_BACKOFF_MAX", 0.5),
+        "settle": get_env_float("CHURN_SETTLE_SEC", 1.0),
+        "write_modes": get_env_list("CHURN_WRITE_MODES", ("latency",)),
+        "burst": get_env_int("CHURN_BURST", 0),
+    }
+
+def free_port() -> int:
+    """Ask the OS for an unused localhost TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def open_fds() -> int:
+    """Count file descriptors held by this process"""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the pct-th percentile of values (nearest rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff delay for the given attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class TCPConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def recv(self) -> Optional[bytes]:
+        """Read one newline-delimited message, None once the peer is gone"""
+        try:
+            line = await self.reader.readline()
+        except (OSError, asyncio.IncompleteReadError):
+            return None
+        return line or None
+
+    def abort(self) -> None:
+        """Drop the connection without a FIN"""
+        self.writer.transport.abort()
+
+    async def close(self) -> None:
+        """Close the connection and release its socket"""
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+class WSConnection:
+    def __init__(self, websocket: Any):
+        self.websocket = websocket
+
+    async def recv(self) -> Optional[Any]:
+        """Read one WebSocket message, None once the peer is gone"""
+        try:
+            return await self.websocket.recv()
+        except Exception:
+            return None
+
+    def abort(self) -> None:
+        """Drop the connection without a close handshake"""
+        self.websocket.transport.abort()
+
+    async def close(self) -> None:
+        """Close the connection and release its socket"""
+        try:
+            await asyncio.wait_for(self.websocket.close(), timeout=1.0)
+        except Exception:
+            self.websocket.transport.abort()
+
+class ChurnBench:
+    def __init__(self, service: str, mode: str, config: Dict[str, Any], write_mode: Optional[str] = None):
+        self.service = service
+        self.mode = mode
+        self.write_mode = write_mode
+        self.config = config
+        self.port = free_port()
+        self.stopping = False
+
+        # Results
+        self.connects = 0
+        self.connect_failures = 0
+        self.recovery: List[float] = []
+        self.first_message: List[float] = []
+        self.steady_gaps: List[float] = []
+        self.churn_conns: Dict[int, Any] = {}
+        self.steady_conns: Dict[int, Any] = {}
+
+    def make_state(self) -> Dict[str, Any]:
+        """Build an application state that points the server at a private port"""
+        state = init_state()
+        state[SERVICES[self.service][1]] = self.port
+        state["heartbeat_interval"] = self.config["heartbeat_interval"]
+        state["message_interval"] = self.config["message_interval"]
+        if self.write_mode:
+            state["write_mode"] = self.write_mode
+        return state
+
+    async def connect(self) -> Any:
+        """Open a client connection to the service under test"""
+        if self.service == "ws":
+            return WSConnection(await websockets.connect(f"ws://127.0.0.1:{self.port}/"))
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        return TCPConnection(reader, writer)
+
+    async def client_loop(self, client_id: int, steady: bool) -> None:
+        """Keep one simulated client connected, reconnecting with jittered backoff"""
+        conns = self.steady_conns if steady else self.churn_conns
+        attempt = 0
+        disconnected_at: Optional[float] = None
+        # Steady clients keep last_at across reconnects so an outage shows up as one long gap
+        last_at: Optional[float] = None
+
+        while not self.stopping:
+            attempt_at = time.perf_counter()
+            try:
+                conn = await self.connect()
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+                self.connect_failures += 1
+                attempt += 1
+                await asyncio.sleep(backoff_delay(attempt, self.config["backoff_base"], self.config["backoff_max"]))
+                continue
+
+            attempt = 0
+            self.connects += 1
+            receiving = False
+            try:
+                while True:
+                    message = await conn.recv()
+                    now = time.perf_counter()
+                    if message is None:
+                        break
+                    if not receiving:
+                        # Only a client that is receiving again counts as recovered
+                        receiving = True
+                        conns[client_id] = conn
+                        self.first_message.append(now - attempt_at)
+                        if disconnected_at is not None:
+                            self.recovery.append(now - disconnected_at)
+                    if steady:
+                        if last_at is not None:
+                            self.steady_gaps.append(now - last_at)
+                        last_at = now
+            finally:
+                conns.pop(client_id, None)
+                disconnected_at = time.perf_counter()
+                await conn.close()
+
+            await asyncio.sleep(backoff_delay(0, self.config["backoff_base"], self.config["backoff_max"]))
+
+    async def wait_connected(self, timeout: float) -> bool:
+        """Wait until every simulated client is receiving messages"""
+        total = self.config["clients"] + self.config["steady"]
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if len(self.churn_conns) + len(self.steady_conns) >= total:
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    def churn(self, server: Any) -> None:
+        """Disconnect clients using the configured mode"""
+        if self.mode == "abort":
+            for conn in list(self.churn_conns.values()):
+                try:
+                    conn.abort()
+                except Exception:
+                    pass
+        else:
+            server.close_clients(graceful=self.mode == "graceful")
+
+    async def burst(self, server: Any) -> None:
+        """Broadcast a run of data messages back to back"""
+        build = SERVICES[self.service][2]
+        for _ in range(self.config["burst"]):
+            await server.broadcast(build(sample_track()))
+
+    async def run(self) -> Dict[str, Any]:
+        """Run a full churn cycle against one service and return the results"""
+        cls = SERVICES[self.service][0]
+        server = cls(self.make_state())
+        server_task = asyncio.create_task(server.start())
+
+        tasks = [asyncio.create_task(self.client_loop(i, steady=False))
+                 for i in range(self.config["clients"])]
+        tasks += [asyncio.create_task(self.client_loop(i, steady=True))
+                  for i in range(self.config["steady"])]
+
+        try:
+            if not await self.wait_connected(timeout=10.0):
+                receiving = len(self.churn_conns) + len(self.steady_conns)
+                total = self.config["clients"] + self.config["steady"]
+                raise RuntimeError(f"only {receiving}/{total} clients receiving before the storm")
+            # Steady-client gaps during the settle period are the pre-storm baseline
+            self.steady_gaps.clear()
+            await asyncio.sleep(self.config["settle"])
+            baseline_gaps = list(self.steady_gaps)
+            gc.collect()
+            fds_before = open_fds()
+            mem_before = tracemalloc.get_traced_memory()[0]
+
+            # Only count what happens during the storm itself
+            self.connects = 0
+            self.connect_failures = 0
+            self.recovery.clear()
+            self.first_message.clear()
+            self.steady_gaps.clear()
+            coalescer = getattr(server, "coalescer", None)
+            if coalescer:
+                coalescer.histogram.clear()
+                coalescer.messages = 0
+
+            period = 1.0 / self.config["rate"] if self.config["rate"] > 0 else 0.0
+            started = time.perf_counter()
+            for _ in range(self.config["cycles"]):
+                self.churn(server)
+                await self.burst(server)
+                await asyncio.sleep(period)
+            elapsed = time.perf_counter() - started
+            # Count connects over the same window as elapsed
+            storm_connects = self.connects
+            if coalescer:
+                coalescer.flush()
+                batches = dict(coalescer.histogram)
+                messages = coalescer.messages
+
+            recovered = await self.wait_connected(timeout=10.0)
+            await asyncio.sleep(self.config["settle"])
+            gc.collect()
+            fds_after = open_fds()
+            mem_after = tracemalloc.get_traced_memory()[0]
+        finally:
+            self.stopping = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            server_task.cancel()
+            await asyncio.gather(server_task, return_exceptions=True)
+
+        cycles = max(1, self.config["cycles"])
+        result = {
+            "service": self.service,
+            "mode": self.mode,
+            "write_mode": self.write_mode,
+            "recovered": recovered,
+            "connects": storm_connects,
+            "connect_failures": self.connect_failures,
+            "accept_rate": storm_connects / elapsed if elapsed > 0 else 0.0,
+            "recovery_p50": percentile(self.recovery, 50),
+            "recovery_p99": percentile(self.recovery, 99),
+            "first_msg_p50": percentile(self.first_message, 50),
+            "first_msg_p99": percentile(self.first_message, 99),
+            "baseline_gap_p50": percentile(baseline_gaps, 50),
+            "baseline_gap_p99": percentile(baseline_gaps, 99),
+            "baseline_gap_max": max(baseline_gaps, default=0.0),
+            "steady_gap_p50": percentile(self.steady_gaps, 50),
+            "steady_gap_p99": percentile(self.steady_gaps, 99),
+            "steady_gap_max": max(self.steady_gaps, default=0.0),
+            "fd_delta": fds_after - fds_before,
+            "mem_delta_per_cycle": (mem_after - mem_before) / cycles,
+        }
+        if coalescer:
+            result["messages"] = messages
+            result["batches"] = batches
+        return result
+
+def ms(seconds: float) -> str:
+    """Format a duration in milliseconds"""
+    return f"{seconds * 1000:.1f}ms"
+
+def report(result: Dict[str, Any]) -> None:
+    """Log one benchmark result"""
+    source = f"{SOURCE}:{result['service']}:{result['mode']}"
+    if result["write_mode"]:
+        source += f":{result['write_mode']}"
+    log(source, f"recovered={result['recovered']} connects={result['connects']} "
+                f"failed_connects={result['connect_failures']} accept_rate={result['accept_rate']:.1f}/s")
+    log(source, f"recovery p50={ms(result['recovery_p50'])} p99={ms(result['recovery_p99'])} "
+                f"connect->first_msg p50={ms(result['first_msg_p50'])} p99={ms(result['first_msg_p99'])}")
+    log(source, f"steady gap p50={ms(result['steady_gap_p50'])} p99={ms(result['steady_gap_p99'])} "
+                f"max={ms(result['steady_gap_max'])} (before storm p50={ms(result['baseline_gap_p50'])} "
+                f"p99={ms(result['baseline_gap_p99'])} max={ms(result['baseline_gap_max'])})")
+    log(source, f"fd_delta={result['fd_delta']} mem_delta={result['mem_delta_per_cycle'] / 1024:.2f}KiB/cycle")
+    if "batches" in result:
+        # Each flush is one write call, so messages per flush is the syscall saving
+        flushes = sum(result["batches"].values())
+        per_flush = result["messages"] / flushes if flushes else 0.0
+        log(source, f"writes: messages={result['messages']} msgs/flush={per_flush:.1f} "
+                    f"{format_batches(result['batches'])}")
+
+async def main() -> List[Dict[str, Any]]:
+    """Run the benchmark matrix described by the environment"""
+    config = load_config()
+    log(SOURCE, f"config: {config}")
+    tracemalloc.start()
+    results = []
+    try:
+        for service in config["services"]:
+            if service not in SERVICES:
+                log(SOURCE, f"unknown service {service}, skipping")
+                continue
+            for mode in config["modes"]:
+                if mode not in MODES:
+                    log(SOURCE, f"unknown mode {mode}, skipping")
+                    continue
+                # Write modes only apply to the TCP servers
+                write_modes = config["write_modes"] if service != "ws" else [None]
+                for write_mode in write_modes:
+                    if write_mode is not None and write_mode not in WRITE_MODES:
+                        log(SOURCE, f"unknown write mode {write_mode}, skipping")
+                        continue
+                    try:
+                        result = await ChurnBench(service, mode, config, write_mode).run()
+                    except RuntimeError as e:
+                        log(f"{SOURCE}:{service}:{mode}", f"aborted: {str(e)}")
+                        continue
+                    report(result)
+                    results.append(result)
+    finally:
+        tracemalloc.stop()
+    return results
+
+if __name__ == "__main__":
+    asyncio.run(main())
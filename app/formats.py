@@ -1,7 +1,6 @@
 from datetime import datetime
 import random
 from typing import Dict, Any
-from .proto.track_pb2 import DistributionTrack
 
 def iso8601z() -> str:
     """Return current time in ISO8601 format with Z suffix"""
@@ -52,6 +51,7 @@ def build_json_track(track: Dict[str, Any]) -> Dict[str, Any]:
 
 def build_protobuf_track(track: Dict[str, Any]) -> bytes:
     """Convert track data to Protobuf message"""
+    from .proto.track_pb2 import DistributionTrack
     pb_track = DistributionTrack()
     for key, value in track.items():
         setattr(pb_track, key, value)
@@ -59,6 +59,7 @@ def build_protobuf_track(track: Dict[str, Any]) -> bytes:
 
 def build_protobuf_heartbeat() -> bytes:
     """Create a Protobuf heartbeat message"""
+    from .proto.track_pb2 import DistributionTrack
     pb_track = DistributionTrack()
     pb_track.tag = "HEARTBEAT"
     pb_track.trackid = 0
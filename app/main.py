@@ -1,12 +1,22 @@
 import asyncio
+import importlib
+import ipaddress
 import os
 import signal
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, List, Set, Tuple
 
 from .logutil import log
 from .menu import Menu
-from .services import tcp_xml, tcp_json, ws_json, udp_unicast
+from .probe import ReadinessProbe
+
+# Service name -> module under app.services, imported only when selected
+SERVICE_MODULES = {
+    "xml": "tcp_xml",
+    "json": "tcp_json",
+    "ws": "ws_json",
+    "udp": "udp_unicast",
+}
 
 def get_env_int(name: str, default: int) -> int:
     """Get integer from environment variable with default"""
@@ -22,9 +32,40 @@ def get_env_float(name: str, default: float) -> float:
     except ValueError:
         return default
 
+def get_env_list(name: str, default: Tuple[str, ...]) -> List[str]:
+    """Get comma separated list from environment variable with default"""
+    value = os.getenv(name)
+    if not value:
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def parse_destination(text: str) -> Tuple[str, int]:
+    """Parse an 'ip:port' string into an IPv4 address and port"""
+    ip, _, port = text.strip().rpartition(":")
+    address = ipaddress.IPv4Address(ip)
+    port_num = int(port)
+    if not (0 < port_num < 65536):
+        raise ValueError(f"invalid port {port}")
+    return str(address), port_num
+
+def get_env_destinations(name: str) -> Set[Tuple[str, int]]:
+    """Get a set of 'ip:port' destinations from a comma separated environment variable"""
+    destinations = set()
+    for item in os.getenv(name, "").split(","):
+        if not item.strip():
+            continue
+        try:
+            destinations.add(parse_destination(item))
+        except ValueError:
+            log("main", f"ignoring invalid destination {item!r} in {name}")
+    return destinations
+
 def init_state() -> Dict[str, Any]:
     """Initialize application state"""
-    return {
+    state = {
+        # Services to start
+        "services": get_env_list("SERVICES", tuple(SERVICE_MODULES)),
+        
         # Service ports
         "tcp_xml_port": get_env_int("TCP_XML_PORT", 9001),
         "tcp_json_port": get_env_int("TCP_JSON_PORT", 9002),
@@ -33,11 +74,25 @@ def init_state() -> Dict[str, Any]:
         # UDP configuration
         "udp_dest_ip": os.getenv("UDP_DEST_IP", "127.0.0.1"),
         "udp_dest_port": get_env_int("UDP_DEST_PORT", 9004),
+        "udp_primary": None,
+        "udp_multicast_ttl": get_env_int("UDP_MCAST_TTL", 1),
+        "udp_multicast_loop": os.getenv("UDP_MCAST_LOOP", "1") == "1",
+        "udp_multicast_if": os.getenv("UDP_MCAST_IF", ""),
         
         # Timing intervals
         "heartbeat_interval": get_env_float("HEARTBEAT_SEC", 10.0),
         "message_interval": get_env_float("MESSAGE_SEC", 15.0),
         
+        # Readiness and shutdown
+        "ready_file": os.getenv("READY_FILE", ""),
+        "ready_port": get_env_int("READY_PORT", 0),
+        "drain_timeout": get_env_float("DRAIN_SEC", 5.0),
+        
+        # TCP output batching
+        "write_mode": os.getenv("WRITE_MODE", "latency"),
+        "write_flush_ms": get_env_float("WRITE_FLUSH_MS", 1.0),
+        "write_flush_bytes": get_env_int("WRITE_FLUSH_BYTES", 65536),
+        
         # Service status flags
         "xml_running": False,
         "json_running": False,
@@ -53,8 +108,17 @@ def init_state() -> Dict[str, Any]:
         "xml_close_type": None,
         "json_close_type": None,
         "ws_close_type": None,
-        "udp_dest_update": None,
     }
+    
+    # UDP fan-out targets besides the primary: extra unicast, multicast groups
+    state["udp_destinations"] = get_env_destinations("UDP_DESTS")
+    state["udp_destinations"] |= get_env_destinations("UDP_MCAST_GROUPS")
+    return state
+
+async def start_service(name: str, state: Dict[str, Any]) -> asyncio.Task:
+    """Import a service module on demand and start it once it is listening"""
+    module = importlib.import_module(f".services.{SERVICE_MODULES[name]}", __package__)
+    return await module.start_service(state)
 
 async def main() -> None:
     """Main application entry point"""
@@ -63,63 +127,106 @@ async def main() -> None:
     
     # Create menu
     menu = Menu(state)
+    probe = ReadinessProbe(state)
     
-    # Start all services
-    log("main", "starting services")
+    services = []
+    for name in state["services"]:
+        if name in SERVICE_MODULES:
+            services.append(name)
+        else:
+            log("main", f"unknown service {name}, skipping")
+    
+    # Start selected services concurrently
+    log("main", f"starting services: {', '.join(services)}")
     tasks = []
     
     try:
-        # Start TCP XML server
-        xml_task = await tcp_xml.start_service(state)
-        tasks.append(xml_task)
+        if not services:
+            raise ValueError(f"SERVICES selects no known service (choose from {', '.join(SERVICE_MODULES)})")
         
-        # Start TCP JSON server
-        json_task = await tcp_json.start_service(state)
-        tasks.append(json_task)
+        await probe.start()
         
-        # Start WebSocket server
-        ws_task = await ws_json.start_service(state)
-        tasks.append(ws_task)
+        results = await asyncio.gather(
+            *(start_service(name, state) for name in services),
+            return_exceptions=True
+        )
+        tasks = [result for result in results if isinstance(result, asyncio.Task)]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
         
-        # Start UDP sender
-        udp_task = await udp_unicast.start_service(state)
-        tasks.append(udp_task)
+        # Every listener is bound at this point
+        probe.set_ready()
         
         # Start menu if running with TTY
         if sys.stdin.isatty():
             menu_task = asyncio.create_task(menu.run())
             tasks.append(menu_task)
         
-        # Wait for all tasks or interruption
-        await asyncio.gather(*tasks)
+        # Wait for a task to fail or for interruption. Unlike gather(),
+        # cancelling this wait leaves the tasks running, so the drain
+        # below is what bounds their shutdown.
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
         
     except asyncio.CancelledError:
         log("main", "shutdown requested")
     except Exception as e:
         log("main", f"error: {str(e)}")
+        raise
     finally:
-        # Cancel all tasks
+        # Stop advertising readiness before connections start closing
+        await probe.stop()
+        
+        # Cancel all tasks; services flush and close their clients on the way out
         for task in tasks:
             task.cancel()
         
         if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=state["drain_timeout"])
+            if pending:
+                log("main", f"drain did not finish within {state['drain_timeout']}s, forcing shutdown")
+                for task in pending:
+                    task.cancel()
             await asyncio.gather(*tasks, return_exceptions=True)
         
         log("main", "shutdown complete")
 
+def cancel_all_tasks(loop: asyncio.AbstractEventLoop) -> None:
+    """Cancel and wait for every task still pending, as asyncio.run() does"""
+    pending = asyncio.all_tasks(loop)
+    for task in pending:
+        task.cancel()
+    if pending:
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
 def run() -> None:
     """Run the application"""
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    main_task = loop.create_task(main())
+    exit_code = 0
     
-    # Handle signals
+    # Handle signals: cancelling main starts a bounded drain,
+    # a second signal cuts the drain short
     for sig in (signal.SIGTERM, signal.SIGINT):
-        loop.add_signal_handler(sig, lambda: loop.stop())
+        loop.add_signal_handler(sig, main_task.cancel)
     
     try:
-        loop.run_until_complete(main())
+        loop.run_until_complete(main_task)
+    except asyncio.CancelledError:
+        log("main", "drain interrupted")
+    except Exception:
+        # Already logged by main(); a failed boot or crash must not look like a clean stop
+        exit_code = 1
     finally:
+        cancel_all_tasks(loop)
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
         loop.close()
+    
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
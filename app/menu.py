@@ -1,7 +1,9 @@
 import asyncio
+import ipaddress
 import sys
 from typing import Dict, Any, Optional, List
 from .logutil import log
+from .services.coalescer import MODES as WRITE_MODES, format_batches
 
 class Menu:
     def __init__(self, state: Dict[str, Any]):
@@ -22,6 +24,9 @@ class Menu:
         print("  burst xml|json|ws N           - send N data messages")
         print("  intervals <svc> hb <sec> msg <sec>  - change intervals")
         print("  udp-dest <ip> <port>          - change UDP destination")
+        print("  udp-add <ip> <port>           - add UDP destination or multicast group")
+        print("  udp-remove <ip> <port>        - remove extra UDP destination")
+        print("  write-mode latency|throughput|off  - change TCP output batching")
         print("  quit                          - exit the application")
 
     def show_status(self) -> None:
@@ -45,6 +50,11 @@ class Menu:
                            len(self.state.get("ws_clients", []))))
         print(format_service("UDP", self.state["udp_running"], self.state["udp_paused"]))
         print(f"UDP destination: {self.state['udp_dest_ip']}:{self.state['udp_dest_port']}")
+        destinations = ", ".join(f"{ip}:{port}" for ip, port in sorted(self.state["udp_destinations"]))
+        print(f"UDP extra destinations: {destinations or 'none'}")
+        print(f"TCP write mode: {self.state['write_mode']}")
+        print(f"XML batches:  {format_batches(self.state.get('xml_batches', {}))}")
+        print(f"JSON batches: {format_batches(self.state.get('json_batches', {}))}")
 
     async def handle_command(self, cmd: str) -> None:
         """Process a command from user input"""
@@ -129,9 +139,15 @@ class Menu:
             self.state["message_interval"] = msg_interval
             log(self.source, f"intervals updated for {service}: hb={hb_interval}s msg={msg_interval}s")
         
-        elif cmd_name == "udp-dest":
+        elif cmd_name in ("udp-dest", "udp-add", "udp-remove"):
             if len(parts) != 3:
-                print("Usage: udp-dest <ip> <port>")
+                print(f"Usage: {cmd_name} <ip> <port>")
+                return
+            
+            try:
+                ip = str(ipaddress.IPv4Address(parts[1]))
+            except ValueError:
+                print("IP must be an IPv4 address")
                 return
             
             try:
@@ -142,8 +158,28 @@ class Menu:
                 print("Port must be a number between 1 and 65535")
                 return
             
-            self.state["udp_dest_update"] = (parts[1], port)
-            log(self.source, f"UDP destination update requested: {parts[1]}:{port}")
+            if cmd_name == "udp-dest":
+                # The UDP socket is unconnected, so the new primary applies from the next send
+                self.state["udp_dest_ip"] = ip
+                self.state["udp_dest_port"] = port
+                self.state["udp_primary"] = (ip, port)
+                log(self.source, f"UDP destination changed to {ip}:{port}")
+            elif cmd_name == "udp-add":
+                self.state["udp_destinations"].add((ip, port))
+                log(self.source, f"UDP destination added: {ip}:{port}")
+            elif (ip, port) == self.state["udp_primary"]:
+                print("That is the primary destination; use udp-dest to change it")
+            else:
+                self.state["udp_destinations"].discard((ip, port))
+                log(self.source, f"UDP destination removed: {ip}:{port}")
+        
+        elif cmd_name == "write-mode":
+            if len(parts) != 2 or parts[1] not in WRITE_MODES:
+                print("Usage: write-mode latency|throughput|off")
+                return
+            
+            self.state["write_mode"] = parts[1]
+            log(self.source, f"TCP write mode set to {parts[1]}")
         
         else:
             print("Unknown command. Type 'help' for available commands.")
@@ -0,0 +1,84 @@
+import asyncio
+import os
+from typing import Dict, Any, Optional, Set
+from .logutil import log
+
+class ReadinessProbe:
+    def __init__(self, state: Dict[str, Any]):
+        self.state = state
+        self.source = "ready"
+        self.ready = False
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        """Clear any stale ready file and open the HTTP endpoint if configured"""
+        self.remove_file()
+        port = self.state["ready_port"]
+        if port:
+            self.server = await asyncio.start_server(self.handle_request, '0.0.0.0', port)
+            log(self.source, f"readiness endpoint on :{port}")
+
+    async def handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer any HTTP request with 200 when ready and 503 otherwise"""
+        self.connections.add(writer)
+        try:
+            await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5.0)
+        except Exception:
+            pass
+
+        status = "200 OK" if self.ready else "503 Service Unavailable"
+        body = b"ready\n" if self.ready else b"not ready\n"
+        headers = (
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n"
+        )
+        try:
+            writer.write(headers.encode() + body)
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    def set_ready(self) -> None:
+        """Report ready: write the ready file and answer 200"""
+        self.ready = True
+        path = self.state["ready_file"]
+        if path:
+            try:
+                with open(path, "w") as f:
+                    f.write(f"{os.getpid()}\n")
+            except OSError as e:
+                log(self.source, f"failed to write {path}: {str(e)}")
+        log(self.source, "all services listening")
+
+    def set_not_ready(self) -> None:
+        """Report not ready so load balancers stop sending new clients"""
+        self.ready = False
+        self.remove_file()
+
+    def remove_file(self) -> None:
+        """Delete the ready file if it exists"""
+        path = self.state["ready_file"]
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log(self.source, f"failed to remove {path}: {str(e)}")
+
+    async def stop(self) -> None:
+        """Report not ready and close the HTTP endpoint without waiting on idle probes"""
+        self.set_not_ready()
+        if self.server:
+            self.server.close()
+            self.server = None
+        # wait_closed() would block on these (Python 3.12+); drop them instead
+        for writer in self.connections.copy():
+            writer.transport.abort()
+        self.connections.clear()
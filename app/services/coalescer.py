@@ -0,0 +1,127 @@
+import asyncio
+import socket
+from typing import Dict, Any, List, Optional, Set
+from ..logutil import log
+
+# latency:    TCP_NODELAY, flush once the current loop iteration is done
+# throughput: Nagle on, flush after write_flush_ms or write_flush_bytes
+# off:        one writer.write() per message (no batching)
+MODES = ("latency", "throughput", "off")
+
+class WriteCoalescer:
+    def __init__(self, state: Dict[str, Any], source: str):
+        self.state = state
+        self.source = source
+        self.pending: Dict[asyncio.StreamWriter, List[bytes]] = {}
+        self.pending_bytes: Dict[asyncio.StreamWriter, int] = {}
+        self.flush_handle: Optional[asyncio.Handle] = None
+        self.writers: Set[asyncio.StreamWriter] = set()
+        self.applied_mode = self.mode
+
+        # Batch size distribution: power-of-two bucket -> number of flushes
+        self.histogram: Dict[int, int] = {}
+        self.messages = 0
+
+    @property
+    def mode(self) -> str:
+        """Current write mode, falling back to latency for unknown values"""
+        mode = self.state["write_mode"]
+        return mode if mode in MODES else "latency"
+
+    def configure(self, writer: asyncio.StreamWriter) -> None:
+        """Apply the socket options for the current mode to a client"""
+        self.writers.add(writer)
+        sock = writer.get_extra_info("socket")
+        if sock is None:
+            return
+        try:
+            nodelay = 0 if self.mode == "throughput" else 1
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, nodelay)
+        except OSError as e:
+            log(self.source, f"failed to set TCP_NODELAY: {str(e)}")
+
+    def apply_mode(self) -> None:
+        """Follow a runtime mode change: flush queued batches and reapply socket options"""
+        if self.mode == self.applied_mode:
+            return
+        self.applied_mode = self.mode
+        self.flush()
+        for writer in self.writers.copy():
+            if not writer.is_closing():
+                self.configure(writer)
+
+    def write(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        """Queue data for a client, flushing when the batch is full"""
+        self.apply_mode()
+        if self.mode == "off":
+            # Anything still queued must go out first to keep the stream in order
+            self.flush_writer(writer)
+            writer.write(data)
+            self.record(1)
+            return
+
+        self.pending.setdefault(writer, []).append(data)
+        size = self.pending_bytes.get(writer, 0) + len(data)
+        self.pending_bytes[writer] = size
+
+        if size >= self.state["write_flush_bytes"]:
+            self.flush_writer(writer)
+        else:
+            self.schedule()
+
+    def schedule(self) -> None:
+        """Arm the flush timer if it is not already pending"""
+        if self.flush_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        if self.mode == "latency":
+            self.flush_handle = loop.call_soon(self.flush)
+        else:
+            self.flush_handle = loop.call_later(self.state["write_flush_ms"] / 1000, self.flush)
+
+    def flush(self) -> None:
+        """Flush every client with queued data"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        for writer in list(self.pending):
+            self.flush_writer(writer)
+
+    def flush_writer(self, writer: asyncio.StreamWriter) -> None:
+        """Hand one client's queued data to the transport in a single call"""
+        batch = self.pending.pop(writer, None)
+        self.pending_bytes.pop(writer, None)
+        if not batch or writer.is_closing():
+            return
+
+        writer.writelines(batch)
+        self.record(len(batch))
+
+    async def drain(self, writer: asyncio.StreamWriter) -> None:
+        """Apply backpressure, counting queued data against the transport's high-water mark"""
+        transport = writer.transport
+        _, high = transport.get_write_buffer_limits()
+        if transport.get_write_buffer_size() + self.pending_bytes.get(writer, 0) > high:
+            # Already backed up: push the batch now so drain() sees it
+            self.flush_writer(writer)
+        await writer.drain()
+
+    def discard(self, writer: asyncio.StreamWriter) -> None:
+        """Drop queued data for a client that is going away"""
+        self.writers.discard(writer)
+        self.pending.pop(writer, None)
+        self.pending_bytes.pop(writer, None)
+
+    def record(self, count: int) -> None:
+        """Account one flush of count messages"""
+        bucket = 1 << (count - 1).bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+        self.messages += count
+
+def format_batches(histogram: Dict[int, int]) -> str:
+    """Render a batch size histogram as 'size:count' pairs"""
+    if not histogram:
+        return "no flushes"
+    flushes = sum(histogram.values())
+    buckets = " ".join(f"<={size}:{count}" for size, count in sorted(histogram.items()))
+    return f"flushes={flushes} {buckets}"
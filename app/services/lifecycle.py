@@ -0,0 +1,17 @@
+import asyncio
+
+async def wait_ready(ready: asyncio.Event, task: asyncio.Task) -> None:
+    """Wait until a service signals ready, re-raising if it fails first"""
+    ready_wait = asyncio.create_task(ready.wait())
+    try:
+        await asyncio.wait({ready_wait, task}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        # Startup was abandoned; don't leave the service running unowned
+        task.cancel()
+        raise
+    finally:
+        ready_wait.cancel()
+    if not ready.is_set():
+        # The service task ended before binding; surface its error
+        await task
+        raise RuntimeError("service stopped before it was ready")
\ No newline at end of file
@@ -2,6 +2,8 @@ import asyncio
 import json
 from typing import Set, Dict, Any
 from ..logutil import log
+from .coalescer import WriteCoalescer
+from .lifecycle import wait_ready
 from ..formats import build_json_heartbeat, build_json_track, sample_track
 
 class JSONServer:
@@ -9,11 +11,15 @@ class JSONServer:
         self.state = state
         self.clients: Set[asyncio.StreamWriter] = set()
         self.source = "tcp_json"
+        self.coalescer = WriteCoalescer(state, self.source)
+        self.ready = asyncio.Event()
+        self.state["json_batches"] = self.coalescer.histogram
 
     async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
         """Handle individual client connection"""
         peername = writer.get_extra_info('peername')
         log(self.source, f"new client connection from {peername}")
+        self.coalescer.configure(writer)
         self.clients.add(writer)
         
         try:
@@ -24,7 +30,8 @@ class JSONServer:
         except Exception:
             pass
         finally:
-            self.clients.remove(writer)
+            self.clients.discard(writer)
+            self.coalescer.discard(writer)
             try:
                 writer.close()
                 await writer.wait_closed()
@@ -37,19 +44,20 @@ class JSONServer:
         if not self.clients or not self.state["json_running"]:
             return
         
-        json_str = json.dumps(message) + "\n"
+        data = (json.dumps(message) + "\n").encode()
         dead_clients = set()
         
-        for writer in self.clients:
+        for writer in self.clients.copy():
             try:
-                writer.write(json_str.encode())
-                await writer.drain()
+                self.coalescer.write(writer, data)
+                await self.coalescer.drain(writer)
             except Exception:
                 dead_clients.add(writer)
         
         # Clean up dead clients
         for writer in dead_clients:
-            self.clients.remove(writer)
+            self.clients.discard(writer)
+            self.coalescer.discard(writer)
             try:
                 writer.close()
             except Exception:
@@ -77,22 +85,45 @@ class JSONServer:
             '0.0.0.0', 
             self.state["tcp_json_port"]
         )
+        self.ready.set()
         log(self.source, f"listening on :{self.state['tcp_json_port']}")
         
-        async with server:
-            await server.serve_forever()
+        try:
+            # The server is already accepting; block here until cancelled.
+            # serve_forever() is avoided because on cancel it waits for every
+            # client to disconnect before we get a chance to drain them.
+            await asyncio.get_running_loop().create_future()
+        finally:
+            server.close()
+            await self.drain()
+            await server.wait_closed()
 
     def close_clients(self, graceful: bool = True) -> None:
         """Close all client connections"""
         for writer in self.clients.copy():
             try:
                 if graceful:
+                    self.coalescer.flush_writer(writer)
                     writer.write_eof()
+                else:
+                    self.coalescer.discard(writer)
                 writer.close()
             except Exception:
                 pass
         self.clients.clear()
 
+    async def drain(self) -> None:
+        """Flush pending sends and close clients gracefully"""
+        writers = self.clients.copy()
+        self.close_clients(graceful=True)
+        try:
+            await asyncio.gather(*(writer.wait_closed() for writer in writers), return_exceptions=True)
+        except asyncio.CancelledError:
+            # Drain bound exceeded: drop whatever is still unsent
+            for writer in writers:
+                writer.transport.abort()
+            raise
+
     async def start(self) -> None:
         """Start all server tasks"""
         self.state["json_running"] = True
@@ -106,4 +137,6 @@ class JSONServer:
 async def start_service(state: Dict[str, Any]) -> asyncio.Task:
     """Create and start the JSON server service"""
     server = JSONServer(state)
-    return asyncio.create_task(server.start())
\ No newline at end of file
+    task = asyncio.create_task(server.start())
+    await wait_ready(server.ready, task)
+    return task
\ No newline at end of file
@@ -1,6 +1,9 @@
 import asyncio
-from typing import Dict, Any, Tuple
+import ipaddress
+import socket
+from typing import Dict, Any, Set, Tuple
 from ..logutil import log
+from .lifecycle import wait_ready
 from ..formats import build_protobuf_heartbeat, build_protobuf_track, sample_track
 
 class UDPSender:
@@ -8,36 +11,64 @@ class UDPSender:
         self.state = state
         self.transport = None
         self.source = "udp"
+        self.ready = asyncio.Event()
 
     async def create_endpoint(self) -> None:
-        """Create UDP endpoint"""
+        """Create a single unconnected UDP endpoint shared by all destinations"""
+        self.state["udp_primary"] = await self.resolve(self.state["udp_dest_ip"], self.state["udp_dest_port"])
         loop = asyncio.get_running_loop()
         transport, _ = await loop.create_datagram_endpoint(
             asyncio.DatagramProtocol,
-            remote_addr=(self.state["udp_dest_ip"], self.state["udp_dest_port"])
+            local_addr=("0.0.0.0", 0),
+            family=socket.AF_INET
         )
         self.transport = transport
-        log(self.source, f"sending to {self.state['udp_dest_ip']}:{self.state['udp_dest_port']}")
+        self.configure_multicast()
+        log(self.source, f"sending to {self.format_destinations()}")
+
+    async def resolve(self, host: str, port: int) -> Tuple[str, int]:
+        """Resolve a host name to an IPv4 address once, so sendto() never does DNS"""
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        return infos[0][4][0], port
+
+    def destinations(self) -> Set[Tuple[str, int]]:
+        """All current send targets: the primary plus any extra destinations"""
+        targets = set(self.state["udp_destinations"])
+        if self.state["udp_primary"]:
+            targets.add(self.state["udp_primary"])
+        return targets
+
+    def configure_multicast(self) -> None:
+        """Apply multicast TTL, loopback and interface options to the socket"""
+        sock = self.transport.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.state["udp_multicast_ttl"])
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, int(self.state["udp_multicast_loop"]))
+            if self.state["udp_multicast_if"]:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                                socket.inet_aton(self.state["udp_multicast_if"]))
+        except OSError as e:
+            log(self.source, f"failed to set multicast options: {str(e)}")
+
+    def format_destinations(self) -> str:
+        """Describe the current destinations, marking multicast groups"""
+        targets = self.destinations()
+        if not targets:
+            return "no destinations"
+        return ", ".join(
+            f"{ip}:{port}" + (" (multicast)" if ipaddress.ip_address(ip).is_multicast else "")
+            for ip, port in sorted(targets)
+        )
 
     def send_message(self, message: bytes) -> None:
-        """Send UDP message to configured destination"""
+        """Send an encoded UDP message to every configured destination"""
         if self.transport and self.state["udp_running"] and not self.state["udp_paused"]:
-            try:
-                self.transport.sendto(message)
-            except Exception as e:
-                log(self.source, f"failed to send: {str(e)}")
-
-    async def update_destination(self, ip: str, port: int) -> None:
-        """Update the UDP destination address"""
-        old_transport = self.transport
-        self.state["udp_dest_ip"] = ip
-        self.state["udp_dest_port"] = port
-        
-        if old_transport:
-            old_transport.close()
-        
-        await self.create_endpoint()
-        log(self.source, f"destination changed to {ip}:{port}")
+            for dest in self.destinations():
+                try:
+                    self.transport.sendto(message, dest)
+                except Exception as e:
+                    log(self.source, f"failed to send to {dest[0]}:{dest[1]}: {str(e)}")
 
     async def heartbeat_loop(self) -> None:
         """Send heartbeats periodically"""
@@ -59,11 +90,16 @@ class UDPSender:
         self.state["udp_running"] = True
         self.state["udp_paused"] = False
         await self.create_endpoint()
+        self.ready.set()
         
-        await asyncio.gather(
-            self.heartbeat_loop(),
-            self.data_loop()
-        )
+        try:
+            await asyncio.gather(
+                self.heartbeat_loop(),
+                self.data_loop()
+            )
+        finally:
+            # Closing a datagram transport sends anything still buffered first
+            self.stop()
 
     def stop(self) -> None:
         """Stop the UDP sender"""
@@ -74,4 +110,6 @@ class UDPSender:
 async def start_service(state: Dict[str, Any]) -> asyncio.Task:
     """Create and start the UDP sender service"""
     sender = UDPSender(state)
-    return asyncio.create_task(sender.start())
\ No newline at end of file
+    task = asyncio.create_task(sender.start())
+    await wait_ready(sender.ready, task)
+    return task
\ No newline at end of file
@@ -4,6 +4,7 @@ from typing import Set, Dict, Any
 import websockets
 from websockets.server import WebSocketServerProtocol
 from ..logutil import log
+from .lifecycle import wait_ready
 from ..formats import build_json_heartbeat, build_json_track, sample_track
 
 class WebSocketServer:
@@ -11,6 +12,7 @@ class WebSocketServer:
         self.state = state
         self.clients: Set[WebSocketServerProtocol] = set()
         self.source = "ws"
+        self.ready = asyncio.Event()
 
     async def handle_client(self, websocket: WebSocketServerProtocol) -> None:
         """Handle individual WebSocket client connection"""
@@ -21,7 +23,7 @@ class WebSocketServer:
         except Exception:
             pass
         finally:
-            self.clients.remove(websocket)
+            self.clients.discard(websocket)
             log(self.source, f"client {websocket.remote_address} disconnected")
 
     async def broadcast(self, message: Dict[str, Any]) -> None:
@@ -32,7 +34,7 @@ class WebSocketServer:
         json_str = json.dumps(message)
         dead_clients = set()
 
-        for websocket in self.clients:
+        for websocket in self.clients.copy():
             try:
                 await websocket.send(json_str)
             except Exception:
@@ -63,7 +65,11 @@ class WebSocketServer:
 
     async def _close_clients(self, graceful: bool) -> None:
         """Asynchronously close all client connections"""
-        for websocket in self.clients.copy():
+        # Only close the clients present now; ones that reconnect while
+        # the close handshakes run must stay tracked
+        clients = self.clients.copy()
+        self.clients -= clients
+        for websocket in clients:
             try:
                 if graceful:
                     await websocket.close()
@@ -71,26 +77,51 @@ class WebSocketServer:
                     websocket.transport.close()
             except Exception:
                 pass
-        self.clients.clear()
+
+    async def drain(self, server: Any) -> None:
+        """Close clients with a close frame, bounded by the drain timeout"""
+        server.close()
+        try:
+            await asyncio.wait_for(server.wait_closed(), timeout=self.state["drain_timeout"])
+        except asyncio.TimeoutError:
+            log(self.source, "close handshake timed out, dropping remaining clients")
+            self.abort_clients()
+        except asyncio.CancelledError:
+            self.abort_clients()
+            raise
+
+    def abort_clients(self) -> None:
+        """Drop every client connection without waiting for the peer"""
+        for websocket in self.clients.copy():
+            try:
+                websocket.transport.abort()
+            except Exception:
+                pass
 
     async def start(self) -> None:
         """Start the WebSocket server and message loops"""
         self.state["ws_running"] = True
         self.state["ws_paused"] = False
         
-        async with websockets.serve(
+        server = await websockets.serve(
             self.handle_client,
             "0.0.0.0",
             self.state["ws_json_port"]
-        ) as server:
-            log(self.source, f"listening on :{self.state['ws_json_port']}")
+        )
+        self.ready.set()
+        log(self.source, f"listening on :{self.state['ws_json_port']}")
+        try:
             await asyncio.gather(
                 self.heartbeat_loop(),
                 self.data_loop(),
                 server.wait_closed()
             )
+        finally:
+            await self.drain(server)
 
 async def start_service(state: Dict[str, Any]) -> asyncio.Task:
     """Create and start the WebSocket server service"""
     server = WebSocketServer(state)
-    return asyncio.create_task(server.start())
\ No newline at end of file
+    task = asyncio.create_task(server.start())
+    await wait_ready(server.ready, task)
+    return task
\ No newline at end of file